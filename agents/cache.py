@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from diskcache import Cache
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+
+CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", Path(__file__).resolve().parent.parent / "cache"))
+SEMANTIC_LOOKUP_CANDIDATES = 8
+
+
+@lru_cache(maxsize=None)
+def _get_exact_cache() -> Cache:
+    return Cache(str(CACHE_DIR / "llm"))
+
+
+def _model_name(llm) -> str:
+    return getattr(llm, "model_name", None) or getattr(llm, "model", "")
+
+
+def cache_key(model: str, temperature: float, messages: List[Dict]) -> str:
+    payload = json.dumps({"m": model, "t": temperature, "msgs": messages}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _scope(model: str, context: str) -> str:
+    return hashlib.sha256(f"{model}\0{context}".encode()).hexdigest()
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        api_key: str,
+        path: Path = CACHE_DIR / "semantic.sqlite",
+        threshold: float = 0.92,
+        ttl_seconds: float = 24 * 3600,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._embeddings = OpenAIEmbeddings(api_key=api_key, model="text-embedding-3-small")
+        self._lock = threading.Lock()
+        # Semantic matches are only allowed between prompts with the same model and the same grounding
+        # context (retrieved passages, feed entries, fetched pages), so one inner-product index is kept
+        # per scope over L2-normalized query vectors, making scores cosine similarities.
+        self._indexes: Dict[str, Tuple[faiss.IndexFlatIP, List[int]]] = {}
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "id INTEGER PRIMARY KEY, scope TEXT NOT NULL, embedding BLOB NOT NULL, "
+            "response TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - ttl_seconds,))
+        self._db.commit()
+        for row_id, scope, blob in self._db.execute("SELECT id, scope, embedding FROM responses ORDER BY id"):
+            self._add_to_index(scope, row_id, np.frombuffer(blob, dtype="float32"))
+
+    def _add_to_index(self, scope: str, row_id: int, vector: np.ndarray) -> None:
+        if scope not in self._indexes:
+            self._indexes[scope] = (faiss.IndexFlatIP(vector.shape[0]), [])
+        index, ids = self._indexes[scope]
+        index.add(vector.reshape(1, -1))
+        ids.append(row_id)
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self._embeddings.embed_query(text), dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector[0]
+
+    def lookup(self, scope: str, vector: np.ndarray) -> Optional[str]:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            if scope not in self._indexes:
+                return None
+            index, ids = self._indexes[scope]
+            k = min(index.ntotal, SEMANTIC_LOOKUP_CANDIDATES)
+            scores, positions = index.search(vector.reshape(1, -1), k)
+            # Candidates come back best-first; skip expired rows so a stale match cannot hide a fresh one.
+            for score, position in zip(scores[0], positions[0]):
+                if position < 0 or score < self.threshold:
+                    break
+                row = self._db.execute(
+                    "SELECT response, created FROM responses WHERE id = ?", (ids[position],)
+                ).fetchone()
+                if row is not None and row[1] >= cutoff:
+                    return row[0]
+        return None
+
+    def _prune(self, scope: str) -> None:
+        cur = self._db.execute(
+            "DELETE FROM responses WHERE scope = ? AND created < ?", (scope, time.time() - self.ttl_seconds)
+        )
+        if not cur.rowcount:
+            return
+        self._indexes.pop(scope, None)
+        rows = self._db.execute("SELECT id, embedding FROM responses WHERE scope = ? ORDER BY id", (scope,))
+        for row_id, blob in rows.fetchall():
+            self._add_to_index(scope, row_id, np.frombuffer(blob, dtype="float32"))
+
+    def store(self, scope: str, vector: np.ndarray, response: str) -> None:
+        with self._lock:
+            self._prune(scope)
+            cur = self._db.execute(
+                "INSERT INTO responses (scope, embedding, response, created) VALUES (?, ?, ?, ?)",
+                (scope, vector.astype("float32").tobytes(), response, time.time()),
+            )
+            self._db.commit()
+            self._add_to_index(scope, cur.lastrowid, vector)
+
+
+# For synchronous callers only: the async client inside ChatOpenAI stays bound to the
+# event loop it first ran on, so async code should build its own instance per loop.
+@lru_cache(maxsize=32)
+def get_chat_model(model: str, temperature: float, api_key: str) -> ChatOpenAI:
+    return ChatOpenAI(model=model, temperature=temperature, api_key=api_key)
+
+
+@lru_cache(maxsize=None)
+def get_semantic_cache(api_key: str) -> SemanticCache:
+    return SemanticCache(api_key)
+
+
+def _lookup(
+    llm, messages: List[Dict], cache: SemanticCache, query: Optional[str], context: str
+) -> Tuple[str, str, Optional[np.ndarray], Optional[str]]:
+    model = _model_name(llm)
+    key = cache_key(model, llm.temperature, messages)
+    scope = _scope(model, context)
+    exact = _get_exact_cache().get(key)
+    if exact is not None:
+        return scope, key, None, exact
+    if query is None:
+        return scope, key, None, None
+    vector = cache.embed(query)
+    hit = cache.lookup(scope, vector)
+    if hit is not None:
+        _get_exact_cache().set(key, hit, expire=cache.ttl_seconds)
+    return scope, key, vector, hit
+
+
+def _store(cache: SemanticCache, scope: str, key: str, vector: Optional[np.ndarray], content: str) -> None:
+    if vector is not None:
+        cache.store(scope, vector, content)
+    _get_exact_cache().set(key, content, expire=cache.ttl_seconds)
+
+
+def cached_stream(
+    llm, messages: List[Dict], cache: Optional[SemanticCache], query: Optional[str] = None, context: str = ""
+) -> Iterator[str]:
+    if cache is None:
+        for chunk in llm.stream(messages):
+            yield chunk.content
+        return
+    scope, key, vector, hit = _lookup(llm, messages, cache, query, context)
+    if hit is not None:
+        yield hit
+        return
+    parts: List[str] = []
+    for chunk in llm.stream(messages):
+        parts.append(chunk.content)
+        yield chunk.content
+    _store(cache, scope, key, vector, "".join(parts))
+
+
+async def cached_ainvoke(
+    llm, messages: List[Dict], cache: Optional[SemanticCache], query: Optional[str] = None, context: str = ""
+) -> str:
+    if cache is None:
+        resp = await llm.ainvoke(messages)
+        return resp.content
+    scope, key, vector, hit = await asyncio.to_thread(_lookup, llm, messages, cache, query, context)
+    if hit is not None:
+        return hit
+    resp = await llm.ainvoke(messages)
+    await asyncio.to_thread(_store, cache, scope, key, vector, resp.content)
+    return resp.content
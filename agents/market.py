@@ -1,26 +1,112 @@
-from typing import List, Dict
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Dict, Optional, Tuple
 import httpx
 import trafilatura
 from langchain_openai import ChatOpenAI
 
+from agents.cache import SemanticCache, cached_ainvoke, cached_stream, get_chat_model
 
-def fetch_pages(urls: List[str], timeout: float = 12.0) -> List[Dict]:
-    results: List[Dict] = []
+
+MAX_HTML_BYTES = 2_000_000
+
+# ProcessPoolExecutor rejects more than 61 workers on Windows.
+EXTRACT_WORKERS = min(os.cpu_count() or 1, 61)
+
+_EXTRACT_POOL: Optional[ProcessPoolExecutor] = None
+_EXTRACT_POOL_LOCK = threading.Lock()
+
+
+def _extract(html: bytes) -> str:
+    return trafilatura.extract(
+        html,
+        favor_precision=True,
+        include_comments=False,
+        include_tables=False,
+        include_links=False,
+        deduplicate=True,
+    )
+
+
+def _get_extract_pool() -> ProcessPoolExecutor:
+    global _EXTRACT_POOL
+    with _EXTRACT_POOL_LOCK:
+        if _EXTRACT_POOL is None:
+            _EXTRACT_POOL = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+        return _EXTRACT_POOL
+
+
+def _discard_extract_pool(pool: ProcessPoolExecutor) -> None:
+    global _EXTRACT_POOL
+    with _EXTRACT_POOL_LOCK:
+        if _EXTRACT_POOL is pool:
+            _EXTRACT_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _extract_all(htmls: List[bytes]) -> List:
+    loop = asyncio.get_running_loop()
+    pool = _get_extract_pool()
+    extracted = await asyncio.gather(
+        *(loop.run_in_executor(pool, _extract, html) for html in htmls), return_exceptions=True
+    )
+    broken = [i for i, text in enumerate(extracted) if isinstance(text, BrokenProcessPool)]
+    if broken:
+        # A dead worker breaks the whole pool for good; replace it and retry the affected pages once.
+        _discard_extract_pool(pool)
+        pool = _get_extract_pool()
+        retried = await asyncio.gather(
+            *(loop.run_in_executor(pool, _extract, htmls[i]) for i in broken), return_exceptions=True
+        )
+        for i, text in zip(broken, retried):
+            extracted[i] = text
+        if any(isinstance(text, BrokenProcessPool) for text in retried):
+            _discard_extract_pool(pool)
+    return extracted
+
+
+async def afetch_pages(urls: List[str], timeout: float = 12.0) -> List[Dict]:
     headers = {"User-Agent": "MarketResearchAgent/1.0"}
-    for url in urls:
-        try:
-            with httpx.Client(follow_redirects=True, timeout=timeout, headers=headers) as client:
-                r = client.get(url)
-                if r.status_code == 200:
-                    extracted = trafilatura.extract(r.text, include_comments=False, favor_recall=True) or ""
-                    results.append({"url": url, "text": extracted[:20000]})
-        except Exception:
+    limits = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+    async with httpx.AsyncClient(
+        http2=True, follow_redirects=True, timeout=timeout, headers=headers, limits=limits
+    ) as client:
+
+        async def _fetch(url: str):
+            async with client.stream("GET", url) as r:
+                if r.status_code != 200:
+                    return None
+                length = r.headers.get("content-length", "")
+                if length.isdigit() and int(length) > MAX_HTML_BYTES:
+                    return None
+                body = bytearray()
+                async for chunk in r.aiter_bytes():
+                    body.extend(chunk)
+                    if len(body) > MAX_HTML_BYTES:
+                        return None
+            return url, bytes(body)
+
+        fetched = await asyncio.gather(*(_fetch(u) for u in urls), return_exceptions=True)
+
+    pages = [item for item in fetched if item is not None and not isinstance(item, BaseException)]
+    extracted = await _extract_all([html for _, html in pages])
+
+    results: List[Dict] = []
+    for (url, _), text in zip(pages, extracted):
+        if isinstance(text, BaseException):
             continue
+        results.append({"url": url, "text": (text or "")[:20000]})
     return results
 
 
-def synthesize_competitor_brief(competitors: List[str], pages: List[Dict], api_key: str, model: str = "gpt-4o-mini", temperature: float = 0.2) -> str:
-    llm = ChatOpenAI(model=model, temperature=temperature, api_key=api_key)
+def fetch_pages(urls: List[str], timeout: float = 12.0) -> List[Dict]:
+    return asyncio.run(afetch_pages(urls, timeout=timeout))
+
+
+def _brief_messages(competitors: List[str], pages: List[Dict]) -> List[Dict]:
     joined_pages = "\n\n".join([f"URL: {p['url']}\n{p['text']}" for p in pages])
     prompt = (
         "Create a concise market research brief covering the listed competitors. "
@@ -29,8 +115,36 @@ def synthesize_competitor_brief(competitors: List[str], pages: List[Dict], api_k
         f"Competitors: {', '.join(competitors)}\n\n"
         f"Sources (raw):\n{joined_pages[:40000]}"
     )
-    msg = [{"role": "user", "content": prompt}]
-    resp = llm.invoke(msg)
-    return resp.content if hasattr(resp, "content") else str(resp)
+    return [{"role": "user", "content": prompt}]
+
+
+def _brief_cache_inputs(competitors: List[str], pages: List[Dict]) -> Tuple[str, str]:
+    query = ", ".join(competitors) + "\n" + "\n".join(p["url"] for p in pages)
+    return query, "\n\n".join(p["text"] for p in pages)
+
+
+def synthesize_competitor_brief(
+    competitors: List[str],
+    pages: List[Dict],
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.2,
+    cache: Optional[SemanticCache] = None,
+) -> Iterator[str]:
+    llm = get_chat_model(model, 0 if cache else temperature, api_key)
+    query, context = _brief_cache_inputs(competitors, pages)
+    yield from cached_stream(llm, _brief_messages(competitors, pages), cache, query=query, context=context)
+
 
+async def asynthesize_competitor_brief(
+    competitors: List[str],
+    pages: List[Dict],
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.2,
+    cache: Optional[SemanticCache] = None,
+) -> str:
+    llm = ChatOpenAI(model=model, temperature=0 if cache else temperature, api_key=api_key)
+    query, context = _brief_cache_inputs(competitors, pages)
+    return await cached_ainvoke(llm, _brief_messages(competitors, pages), cache, query=query, context=context)
 
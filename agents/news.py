@@ -1,24 +1,132 @@
-from typing import List, Dict
+import atexit
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Iterator, List, Dict, Optional
 import feedparser
 import httpx
+from dateutil import parser as date_parser
+from dateutil import tz
 from langchain_openai import ChatOpenAI
 
+from agents.cache import SemanticCache, cached_ainvoke, cached_stream, get_chat_model
 
-def fetch_rss_entries(feed_urls: List[str], max_items_per_feed: int = 5) -> List[Dict]:
+
+_CLIENT = httpx.Client(
+    http2=True,
+    follow_redirects=True,
+    timeout=12.0,
+    headers={"User-Agent": "MarketResearchAgent/1.0"},
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+)
+atexit.register(_CLIENT.close)
+
+
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+
+US_TZ_MAP = {
+    "EST": tz.gettz("America/New_York"),
+    "EDT": tz.gettz("America/New_York"),
+    "CST": tz.gettz("America/Chicago"),
+    "CDT": tz.gettz("America/Chicago"),
+    "MST": tz.gettz("America/Denver"),
+    "MDT": tz.gettz("America/Denver"),
+    "PST": tz.gettz("America/Los_Angeles"),
+    "PDT": tz.gettz("America/Los_Angeles"),
+}
+
+
+def _entry_link(elem: ET.Element) -> str:
+    for link in elem.findall("link") + elem.findall(ATOM_NS + "link"):
+        href = link.get("href") or (link.text or "").strip()
+        if href and link.get("rel", "alternate") == "alternate":
+            return href
+    return ""
+
+
+def _entry_text(elem: ET.Element, *tags: str, any_namespace: bool = False) -> str:
+    # Plain RSS and Atom elements win over extension namespaces (media:title, itunes:summary, ...);
+    # other namespaces are only consulted when asked, e.g. for dc:date.
+    paths = [path for tag in tags for path in (tag, ATOM_NS + tag)]
+    if any_namespace:
+        paths += ["{*}" + tag for tag in tags]
+    for path in paths:
+        text = elem.findtext(path)
+        if text:
+            return text.strip()
+    return ""
+
+
+def _parse_published(value: str) -> str:
+    if not value:
+        return ""
+    try:
+        return date_parser.parse(value, tzinfos=US_TZ_MAP).isoformat()
+    except (ValueError, OverflowError):
+        return value
+
+
+def _fast_parse(url: str, limit: int, timeout: float = 15.0) -> List[Dict]:
     entries: List[Dict] = []
-    for url in feed_urls:
-        try:
-            feed = feedparser.parse(url)
-            for entry in feed.entries[:max_items_per_feed]:
+    parser = ET.XMLPullParser(events=("end",))
+    with _CLIENT.stream("GET", url, timeout=timeout) as resp:
+        resp.raise_for_status()
+        for chunk in resp.iter_bytes():
+            parser.feed(chunk)
+            for _, elem in parser.read_events():
+                if elem.tag.rsplit("}", 1)[-1] not in ("item", "entry"):
+                    continue
                 entries.append(
                     {
-                        "title": entry.get("title", ""),
-                        "link": entry.get("link", ""),
-                        "summary": entry.get("summary", ""),
-                        "published": entry.get("published", ""),
+                        "title": _entry_text(elem, "title"),
+                        "link": _entry_link(elem),
+                        "summary": _entry_text(elem, "description", "summary", "content"),
+                        "published": _parse_published(_entry_text(elem, "pubDate", "published", "updated", "date", any_namespace=True)),
                         "source": url,
                     }
                 )
+                elem.clear()
+                if len(entries) >= limit:
+                    return entries
+    return entries
+
+
+def _feedparser_entries(url: str, limit: int, timeout: float = 15.0) -> List[Dict]:
+    resp = _CLIENT.get(url, timeout=timeout)
+    resp.raise_for_status()
+    feed = feedparser.parse(resp.content)
+    return [
+        {
+            "title": entry.get("title", ""),
+            "link": entry.get("link", ""),
+            "summary": entry.get("summary", ""),
+            "published": entry.get("published", ""),
+            "source": url,
+        }
+        for entry in feed.entries[:limit]
+    ]
+
+
+def _fetch_feed(url: str, limit: int) -> List[Dict]:
+    try:
+        return _fast_parse(url, limit)
+    except ET.ParseError:
+        return _feedparser_entries(url, limit)
+
+
+def fetch_rss_entries(feed_urls: List[str], max_items_per_feed: int = 5, deadline: float = 20.0) -> List[Dict]:
+    entries: List[Dict] = []
+    if not feed_urls:
+        return entries
+    ex = ThreadPoolExecutor(max_workers=min(16, len(feed_urls)))
+    futures = [ex.submit(_fetch_feed, url, max_items_per_feed) for url in feed_urls]
+    # Feeds still downloading at the deadline are skipped; their threads finish in the background.
+    done, _ = wait(futures, timeout=deadline)
+    ex.shutdown(wait=False, cancel_futures=True)
+    for fut in futures:
+        if fut not in done:
+            continue
+        try:
+            entries.extend(fut.result())
         except Exception:
             continue
     return entries
@@ -26,28 +134,57 @@ def fetch_rss_entries(feed_urls: List[str], max_items_per_feed: int = 5) -> List
 
 def fetch_article_text(url: str, timeout: float = 10.0) -> str:
     try:
-        with httpx.Client(follow_redirects=True, timeout=timeout) as client:
-            resp = client.get(url)
-            if resp.status_code == 200:
-                return resp.text
+        resp = _CLIENT.get(url, timeout=timeout)
+        if resp.status_code == 200:
+            return resp.text
     except Exception:
         return ""
     return ""
 
 
-def summarize_news(entries: List[Dict], api_key: str, model: str = "gpt-4o-mini", temperature: float = 0.2) -> str:
-    if not entries:
-        return "No news entries available."
-    llm = ChatOpenAI(model=model, temperature=temperature, api_key=api_key)
+def _news_bullets(entries: List[Dict]) -> str:
     bullets = []
     for e in entries:
         bullets.append(f"- {e['title']} ({e['link']}) — {e['summary'][:300]}")
+    return "\n".join(bullets)
+
+
+def _news_messages(bullets: str) -> List[Dict]:
     prompt = (
         "Summarize today's news from the following bullet points into a concise brief with 3-5 bullets and a short headline."
-        " Focus on facts. Include links inline when useful.\n\n" + "\n".join(bullets)
+        " Focus on facts. Include links inline when useful.\n\n" + bullets
     )
-    msg = [{"role": "user", "content": prompt}]
-    resp = llm.invoke(msg)
-    return resp.content if hasattr(resp, "content") else str(resp)
+    return [{"role": "user", "content": prompt}]
+
+
+def summarize_news(
+    entries: List[Dict],
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.2,
+    cache: Optional[SemanticCache] = None,
+) -> Iterator[str]:
+    if not entries:
+        yield "No news entries available."
+        return
+    llm = get_chat_model(model, 0 if cache else temperature, api_key)
+    bullets = _news_bullets(entries)
+    # The entries are both the input and the grounding, so only byte-identical prompts can match;
+    # no query is passed and the exact-match tier alone is used.
+    yield from cached_stream(llm, _news_messages(bullets), cache)
+
+
+async def asummarize_news(
+    entries: List[Dict],
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.2,
+    cache: Optional[SemanticCache] = None,
+) -> str:
+    if not entries:
+        return "No news entries available."
+    llm = ChatOpenAI(model=model, temperature=0 if cache else temperature, api_key=api_key)
+    bullets = _news_bullets(entries)
+    return await cached_ainvoke(llm, _news_messages(bullets), cache)
 
 
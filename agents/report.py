@@ -1,16 +1,25 @@
-from typing import List, Optional
+from typing import IO, Dict, Iterator, List, Optional
 import pandas as pd
 from langchain_openai import ChatOpenAI
 
+from agents.cache import SemanticCache, cached_ainvoke, cached_stream, get_chat_model
 
-def load_csv_preview(csv_bytes: bytes, max_rows: int = 2000) -> pd.DataFrame:
-    from io import BytesIO
 
-    buf = BytesIO(csv_bytes)
-    df = pd.read_csv(buf)
-    if len(df) > max_rows:
-        df = df.head(max_rows)
-    return df
+def load_csv_preview(csv_file: IO[bytes], max_rows: int = 2000) -> pd.DataFrame:
+    csv_file.seek(0)
+    return pd.read_csv(csv_file, nrows=max_rows)
+
+
+def _report_messages(title: str, objectives: str, datasets_descriptions: List[str], findings_notes: str) -> List[Dict]:
+    prompt = (
+        f"Produce a well-structured analytical report titled '{title}'.\n"
+        "Include sections: Executive Summary, Objectives, Method (data sources), Key Findings, Charts to Consider, Limitations, and Next Steps.\n"
+        f"Objectives:\n{objectives}\n\n"
+        f"Data Sources (summaries):\n- " + "\n- ".join(datasets_descriptions) + "\n\n"
+        f"Analyst Notes:\n{findings_notes}\n\n"
+        "Write in concise, clear business language using bullet lists."
+    )
+    return [{"role": "user", "content": prompt}]
 
 
 def generate_report(
@@ -21,18 +30,27 @@ def generate_report(
     api_key: str,
     model: str = "gpt-4o-mini",
     temperature: float = 0.2,
+    cache: Optional[SemanticCache] = None,
+) -> Iterator[str]:
+    llm = get_chat_model(model, 0 if cache else temperature, api_key)
+    messages = _report_messages(title, objectives, datasets_descriptions, findings_notes)
+    query = f"{title}\n{objectives}\n{findings_notes}"
+    yield from cached_stream(llm, messages, cache, query=query, context="\n".join(datasets_descriptions))
+
+
+async def agenerate_report(
+    title: str,
+    objectives: str,
+    datasets_descriptions: List[str],
+    findings_notes: str,
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.2,
+    cache: Optional[SemanticCache] = None,
 ) -> str:
-    llm = ChatOpenAI(model=model, temperature=temperature, api_key=api_key)
-    prompt = (
-        f"Produce a well-structured analytical report titled '{title}'.\n"
-        "Include sections: Executive Summary, Objectives, Method (data sources), Key Findings, Charts to Consider, Limitations, and Next Steps.\n"
-        f"Objectives:\n{objectives}\n\n"
-        f"Data Sources (summaries):\n- " + "\n- ".join(datasets_descriptions) + "\n\n"
-        f"Analyst Notes:\n{findings_notes}\n\n"
-        "Write in concise, clear business language using bullet lists."
-    )
-    msg = [{"role": "user", "content": prompt}]
-    resp = llm.invoke(msg)
-    return resp.content if hasattr(resp, "content") else str(resp)
+    llm = ChatOpenAI(model=model, temperature=0 if cache else temperature, api_key=api_key)
+    messages = _report_messages(title, objectives, datasets_descriptions, findings_notes)
+    query = f"{title}\n{objectives}\n{findings_notes}"
+    return await cached_ainvoke(llm, messages, cache, query=query, context="\n".join(datasets_descriptions))
 
 
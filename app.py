@@ -1,4 +1,6 @@
+import asyncio
 import os
+import shutil
 import tempfile
 from pathlib import Path
 from typing import List, Optional
@@ -7,10 +9,11 @@ import streamlit as st
 from dotenv import load_dotenv
 
 from rag.ingest import ensure_index, add_pdfs_to_index
-from rag.rag import load_retriever, answer_question
-from agents.news import fetch_rss_entries, summarize_news
-from agents.market import fetch_pages, synthesize_competitor_brief
-from agents.report import load_csv_preview, generate_report
+from rag.rag import load_vectorstore, answer_question
+from agents.news import fetch_rss_entries, summarize_news, asummarize_news
+from agents.market import fetch_pages, afetch_pages, synthesize_competitor_brief, asynthesize_competitor_brief
+from agents.report import load_csv_preview, generate_report, agenerate_report
+from agents.cache import SemanticCache, get_semantic_cache
 
 
 APP_TITLE = "Document Analyzer RAG Agent"
@@ -28,13 +31,27 @@ def require_api_key() -> Optional[str]:
     return api_key
 
 
+@st.cache_resource
+def cached_vectorstore(index_dir: str, api_key: str):
+    return load_vectorstore(Path(index_dir), api_key)
+
+
+@st.cache_data(max_entries=16)
+def cached_csv_preview(
+    file_id: str, size: int, _csv_file: st.runtime.uploaded_file_manager.UploadedFile, max_rows: int = 2000
+):
+    # Keyed on the upload's id and size; the leading underscore keeps Streamlit from hashing the contents.
+    return load_csv_preview(_csv_file, max_rows=max_rows)
+
+
 def save_uploaded_files(uploaded_files: List[st.runtime.uploaded_file_manager.UploadedFile]) -> List[Path]:
     temp_dir = Path(tempfile.mkdtemp(prefix="uploads_"))
     saved: List[Path] = []
     for uf in uploaded_files:
         target = temp_dir / uf.name
+        uf.seek(0)
         with open(target, "wb") as f:
-            f.write(uf.getbuffer())
+            shutil.copyfileobj(uf, f, length=1 << 20)
         saved.append(target)
     return saved
 
@@ -50,79 +67,126 @@ def sidebar_controls():
         )
         temperature = st.slider("Temperature", 0.0, 1.0, 0.2, 0.05)
         top_k = st.slider("Top-K Chunks", 1, 12, 4)
+        use_cache = st.checkbox(
+            "Cache LLM responses",
+            value=False,
+            help="Reuse answers for near-identical inputs over the same sources. Cached calls run at temperature 0.",
+        )
         if st.button("Reset Index", type="secondary"):
-            if INDEX_DIR.exists():
-                for p in INDEX_DIR.glob("**/*"):
-                    try:
-                        p.unlink()
-                    except IsADirectoryError:
-                        pass
-                # Remove empty directories
-                for p in sorted(INDEX_DIR.glob("**/*"), reverse=True):
-                    if p.is_dir():
-                        try:
-                            p.rmdir()
-                        except OSError:
-                            pass
+            shutil.rmtree(INDEX_DIR, ignore_errors=True)
+            INDEX_DIR.mkdir(parents=True, exist_ok=True)
+            cached_vectorstore.clear()
             st.session_state.pop("retriever_ready", None)
             st.success("Index cleared.")
-        return model, temperature, top_k
+        return model, temperature, top_k, use_cache
 
 
-def news_tab(api_key: str, model: str, temperature: float):
+def news_tab(api_key: str, model: str, temperature: float, cache: Optional[SemanticCache] = None):
     st.subheader("News Summarizer")
     default_feeds = [
         "https://news.google.com/rss?hl=en-US&gl=US&ceid=US:en",
         "https://feeds.feedburner.com/TechCrunch/",
         "https://www.theverge.com/rss/index.xml",
     ]
-    feed_text = st.text_area("RSS feed URLs (one per line)", value="\n".join(default_feeds), height=120)
-    max_items = st.slider("Max items per feed", 1, 15, 5)
+    feed_text = st.text_area("RSS feed URLs (one per line)", value="\n".join(default_feeds), height=120, key="news_feeds")
+    max_items = st.slider("Max items per feed", 1, 15, 5, key="news_max_items")
     if st.button("Summarize News"):
         with st.spinner("Fetching and summarizing..."):
             feeds = [u.strip() for u in feed_text.splitlines() if u.strip()]
             entries = fetch_rss_entries(feeds, max_items_per_feed=max_items)
-            summary = summarize_news(entries, api_key=api_key, model=model, temperature=temperature)
         st.markdown("**Daily Brief**")
-        st.write(summary)
+        st.write_stream(summarize_news(entries, api_key=api_key, model=model, temperature=temperature, cache=cache))
         with st.expander("Raw entries"):
             for e in entries:
                 st.markdown(f"- [{e['title']}]({e['link']}) — {e['published']}")
 
 
-def market_tab(api_key: str, model: str, temperature: float):
+def market_tab(api_key: str, model: str, temperature: float, cache: Optional[SemanticCache] = None):
     st.subheader("Market Researcher")
-    competitors = st.text_input("Competitor names (comma-separated)", placeholder="Acme, Wingify, Foobar")
-    urls_text = st.text_area("Source URLs (one per line)", height=120)
+    competitors = st.text_input("Competitor names (comma-separated)", placeholder="Acme, Wingify, Foobar", key="market_competitors")
+    urls_text = st.text_area("Source URLs (one per line)", height=120, key="market_urls")
     if st.button("Generate Brief"):
         with st.spinner("Collecting and analyzing sources..."):
             url_list = [u.strip() for u in urls_text.splitlines() if u.strip()]
             pages = fetch_pages(url_list)
-            brief = synthesize_competitor_brief([s.strip() for s in competitors.split(",") if s.strip()], pages, api_key=api_key, model=model, temperature=temperature)
         st.markdown("**Competitor Brief**")
-        st.write(brief)
+        st.write_stream(synthesize_competitor_brief([s.strip() for s in competitors.split(",") if s.strip()], pages, api_key=api_key, model=model, temperature=temperature, cache=cache))
         with st.expander("Fetched sources"):
             for p in pages:
                 st.markdown(f"- {p['url']} ({len(p['text'])} chars)")
 
 
-def report_tab(api_key: str, model: str, temperature: float):
+def report_tab(api_key: str, model: str, temperature: float, cache: Optional[SemanticCache] = None):
     st.subheader("Report Generator")
-    title = st.text_input("Report title", "Weekly Intelligence Report")
-    objectives = st.text_area("Objectives", "Summarize key events and insights relevant to product and GTM.")
-    notes = st.text_area("Analyst notes / highlights", "")
+    title = st.text_input("Report title", "Weekly Intelligence Report", key="report_title")
+    objectives = st.text_area("Objectives", "Summarize key events and insights relevant to product and GTM.", key="report_objectives")
+    notes = st.text_area("Analyst notes / highlights", "", key="report_notes")
     csv_files = st.file_uploader("Optional: Upload CSVs (tables)", type=["csv"], accept_multiple_files=True)
     dataset_summaries = []
     if csv_files:
         st.markdown("**CSV Previews**")
         for f in csv_files:
-            df = load_csv_preview(f.getvalue())
+            df = cached_csv_preview(f.file_id, f.size, f)
             dataset_summaries.append(f"CSV {f.name}: {list(df.columns)}; rows={len(df)}")
             st.caption(f"{f.name} — {len(df)} rows")
             st.dataframe(df.head(10))
+    st.session_state["report_datasets"] = dataset_summaries
     if st.button("Generate Report"):
-        with st.spinner("Writing report..."):
-            report = generate_report(title, objectives, dataset_summaries, notes, api_key=api_key, model=model, temperature=temperature)
+        st.markdown("**Report**")
+        st.write_stream(generate_report(title, objectives, dataset_summaries, notes, api_key=api_key, model=model, temperature=temperature, cache=cache))
+
+
+async def run_all(
+    feeds: List[str],
+    max_items: int,
+    competitors: List[str],
+    url_list: List[str],
+    title: str,
+    objectives: str,
+    dataset_summaries: List[str],
+    notes: str,
+    api_key: str,
+    model: str,
+    temperature: float,
+    cache: Optional[SemanticCache] = None,
+):
+    entries, pages = await asyncio.gather(
+        asyncio.to_thread(fetch_rss_entries, feeds, max_items_per_feed=max_items),
+        afetch_pages(url_list),
+    )
+    return await asyncio.gather(
+        asummarize_news(entries, api_key=api_key, model=model, temperature=temperature, cache=cache),
+        asynthesize_competitor_brief(competitors, pages, api_key=api_key, model=model, temperature=temperature, cache=cache),
+        agenerate_report(title, objectives, dataset_summaries, notes, api_key=api_key, model=model, temperature=temperature, cache=cache),
+    )
+
+
+def combined_tab(api_key: str, model: str, temperature: float, cache: Optional[SemanticCache] = None):
+    st.subheader("Combined Brief")
+    st.caption("Runs the News, Market and Report agents together, using the inputs from their tabs.")
+    if st.button("Generate combined brief"):
+        state = st.session_state
+        with st.spinner("Running all agents..."):
+            news, brief, report = asyncio.run(
+                run_all(
+                    [u.strip() for u in state["news_feeds"].splitlines() if u.strip()],
+                    state["news_max_items"],
+                    [s.strip() for s in state["market_competitors"].split(",") if s.strip()],
+                    [u.strip() for u in state["market_urls"].splitlines() if u.strip()],
+                    state["report_title"],
+                    state["report_objectives"],
+                    state.get("report_datasets", []),
+                    state["report_notes"],
+                    api_key=api_key,
+                    model=model,
+                    temperature=temperature,
+                    cache=cache,
+                )
+            )
+        st.markdown("**Daily Brief**")
+        st.write(news)
+        st.markdown("**Competitor Brief**")
+        st.write(brief)
         st.markdown("**Report**")
         st.write(report)
 
@@ -133,10 +197,11 @@ def main():
     st.caption("Upload PDFs, build a local FAISS index, and ask questions with citations.")
 
     api_key = require_api_key()
-    model, temperature, top_k = sidebar_controls()
+    model, temperature, top_k, use_cache = sidebar_controls()
+    cache = get_semantic_cache(api_key) if use_cache and api_key else None
 
-    tab_labels = ["Document Analyzer", "News", "Market", "Report"]
-    tab_analyzer, tab_news, tab_market, tab_report = st.tabs(tab_labels)
+    tab_labels = ["Document Analyzer", "News", "Market", "Report", "Combined"]
+    tab_analyzer, tab_news, tab_market, tab_report, tab_combined = st.tabs(tab_labels)
 
     with tab_analyzer:
         uploaded = st.file_uploader(
@@ -153,6 +218,7 @@ def main():
                 ensure_index(INDEX_DIR)
                 saved_files = save_uploaded_files(uploaded)
                 add_pdfs_to_index(saved_files, INDEX_DIR, api_key)
+                cached_vectorstore.clear()
                 st.session_state["retriever_ready"] = True
             st.success("Ingestion complete.")
 
@@ -162,16 +228,16 @@ def main():
             st.metric("Index Files", size)
 
     if st.session_state.get("retriever_ready") or INDEX_DIR.exists():
-        retriever = load_retriever(INDEX_DIR, api_key, k=top_k)
+        retriever = cached_vectorstore(str(INDEX_DIR), api_key).as_retriever(search_kwargs={"k": top_k})
         st.divider()
         st.subheader("Ask a question")
         question = st.text_input("Your question", placeholder="What does the document say about X?")
         ask_clicked = st.button("Ask")
         if ask_clicked and question.strip():
-            with st.spinner("Thinking..."):
-                result = answer_question(retriever, question, model=model, temperature=temperature, api_key=api_key)
+            with st.spinner("Retrieving..."):
+                result = answer_question(retriever, question, model=model, temperature=temperature, api_key=api_key, cache=cache)
             st.markdown("**Answer**")
-            st.write(result.answer)
+            st.write_stream(result.answer)
             if result.sources:
                 st.markdown("**Sources**")
                 for i, src in enumerate(result.sources, start=1):
@@ -181,13 +247,16 @@ def main():
         st.info("Upload PDFs and click Ingest Documents to get started.")
 
     with tab_news:
-        news_tab(api_key, model, temperature)
+        news_tab(api_key, model, temperature, cache)
 
     with tab_market:
-        market_tab(api_key, model, temperature)
+        market_tab(api_key, model, temperature, cache)
 
     with tab_report:
-        report_tab(api_key, model, temperature)
+        report_tab(api_key, model, temperature, cache)
+
+    with tab_combined:
+        combined_tab(api_key, model, temperature, cache)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,11 @@
+import asyncio
+from itertools import islice
+from functools import lru_cache
 from pathlib import Path
 from typing import Iterable, List
 
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
@@ -14,37 +19,114 @@ def ensure_index(index_dir: Path) -> None:
 def _load_pdfs(paths: Iterable[Path]):
     for path in paths:
         loader = PyPDFLoader(str(path))
-        for doc in loader.load():
+        for doc in loader.lazy_load():
             yield doc
 
 
-def _split_docs(documents, chunk_size: int = 1000, chunk_overlap: int = 150):
-    splitter = RecursiveCharacterTextSplitter(
+@lru_cache(maxsize=None)
+def _get_splitter(chunk_size: int, chunk_overlap: int):
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=["\n\n", "\n", " ", ""]
     )
-    return splitter.split_documents(list(documents))
 
 
+def _split_docs(documents, chunk_size: int = 1000, chunk_overlap: int = 150):
+    splitter = _get_splitter(chunk_size, chunk_overlap)
+    for doc in documents:
+        yield from splitter.split_documents([doc])
+
+
+def _batched(items, size: int):
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+EMBED_BATCH_SIZE = 256
+EMBED_CONCURRENCY = 8
+INDEX_BATCH_SIZE = EMBED_BATCH_SIZE * EMBED_CONCURRENCY
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+QUANTIZE_MIN_VECTORS = 2000
+
+
+# Not memoized: the async OpenAI client inside is bound to the event loop of the ingest run.
 def _get_embeddings(api_key: str):
-    return OpenAIEmbeddings(api_key=api_key, model="text-embedding-3-small")
+    return OpenAIEmbeddings(
+        api_key=api_key, model="text-embedding-3-small", chunk_size=EMBED_BATCH_SIZE, max_retries=6
+    )
+
+
+def _new_index(dim: int):
+    index = faiss.IndexHNSWFlat(dim, HNSW_M)
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def _as_hnsw(index):
+    if isinstance(index, faiss.IndexHNSW):
+        return index
+    hnsw = _new_index(index.d)
+    if index.ntotal:
+        vectors = index.reconstruct_n(0, index.ntotal)
+        faiss.normalize_L2(vectors)
+        hnsw.add(vectors)
+    return hnsw
+
+
+def _maybe_quantize(index):
+    # The 8-bit quantizer learns per-dimension ranges once; training it on a small first upload
+    # ruins recall for everything added later, so stay flat until there is a representative sample.
+    if isinstance(index, faiss.IndexHNSWSQ) or index.ntotal < QUANTIZE_MIN_VECTORS:
+        return index
+    vectors = index.reconstruct_n(0, index.ntotal)
+    quantized = faiss.IndexHNSWSQ(index.d, faiss.ScalarQuantizer.QT_8bit, HNSW_M)
+    quantized.hnsw.efSearch = HNSW_EF_SEARCH
+    quantized.train(vectors)
+    quantized.add(vectors)
+    return quantized
+
+
+async def _aembed_texts(texts: List[str], embeddings) -> List[List[float]]:
+    semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+
+    async def _embed(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            return await embeddings.aembed_documents(batch)
+
+    batches = [texts[i : i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    results = await asyncio.gather(*(_embed(b) for b in batches))
+    return [vector for batch in results for vector in batch]
 
 
 def add_pdfs_to_index(pdf_paths: List[Path], index_dir: Path, api_key: str) -> None:
-    ensure_index(index_dir)
+    asyncio.run(_aadd_pdfs_to_index(pdf_paths, index_dir, api_key))
 
-    raw_docs = list(_load_pdfs(pdf_paths))
-    if not raw_docs:
-        return
 
-    docs = _split_docs(raw_docs)
-    embeddings = _get_embeddings(api_key)
+async def _aadd_pdfs_to_index(pdf_paths: List[Path], index_dir: Path, api_key: str) -> None:
+    ensure_index(index_dir)
 
+    embeddings = _get_embeddings(api_key)
+    vs = None
     if (index_dir / "index.faiss").exists():
-        vs = FAISS.load_local(str(index_dir), embeddings, allow_dangerous_deserialization=True)
-        vs.add_documents(docs)
-        vs.save_local(str(index_dir))
-    else:
-        vs = FAISS.from_documents(docs, embeddings)
+        vs = FAISS.load_local(
+            str(index_dir), embeddings, allow_dangerous_deserialization=True, normalize_L2=True
+        )
+        vs.index = _as_hnsw(vs.index)
+
+    added = False
+    for docs in _batched(_split_docs(_load_pdfs(pdf_paths)), INDEX_BATCH_SIZE):
+        texts = [d.page_content for d in docs]
+        metadatas = [d.metadata for d in docs]
+        text_embeddings = list(zip(texts, await _aembed_texts(texts, embeddings)))
+        if vs is None:
+            index = _new_index(len(text_embeddings[0][1]))
+            vs = FAISS(embeddings, index, InMemoryDocstore(), {}, normalize_L2=True)
+        vs.add_embeddings(text_embeddings, metadatas=metadatas)
+        added = True
+
+    if added:
+        vs.index = _maybe_quantize(vs.index)
         vs.save_local(str(index_dir))
 
 
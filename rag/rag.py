@@ -1,42 +1,73 @@
 from dataclasses import dataclass
-from typing import List
+from functools import lru_cache
+from typing import Iterator, List, Optional
 from pathlib import Path
 
+import tiktoken
 from langchain_community.vectorstores import FAISS
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_openai import OpenAIEmbeddings
+
+from agents.cache import SemanticCache, cached_stream, get_chat_model
+
+
+MAX_CONTEXT_TOKENS = 3500
+
+STATIC_SYSTEM = (
+    "You are a helpful assistant that answers strictly based on the provided context. "
+    "If the answer is not contained in the context, say you don't know. Provide concise answers."
+)
+
+USER_TEMPLATE = "Context:\n{context}\n\nQuestion: {question}"
 
 
 @dataclass
 class QAResult:
-    answer: str
+    answer: Iterator[str]
     sources: List
 
 
+@lru_cache(maxsize=None)
 def _get_embeddings(api_key: str):
     return OpenAIEmbeddings(api_key=api_key, model="text-embedding-3-small")
 
 
-def load_retriever(index_dir: Path, api_key: str, k: int = 4):
+def load_vectorstore(index_dir: Path, api_key: str) -> FAISS:
     embeddings = _get_embeddings(api_key)
-    vs = FAISS.load_local(str(index_dir), embeddings, allow_dangerous_deserialization=True)
-    return vs.as_retriever(search_kwargs={"k": k})
+    return FAISS.load_local(str(index_dir), embeddings, allow_dangerous_deserialization=True, normalize_L2=True)
+
+
+def load_retriever(index_dir: Path, api_key: str, k: int = 4):
+    return load_vectorstore(index_dir, api_key).as_retriever(search_kwargs={"k": k})
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    return tiktoken.get_encoding("o200k_base")
+
+
+def _build_context(docs) -> str:
+    context = "\n\n".join(d.page_content for d in docs)
+    enc = _get_encoding()
+    ids = enc.encode(context, disallowed_special=())
+    if len(ids) <= MAX_CONTEXT_TOKENS:
+        return context
+    # Retrieved passages are ranked by relevance, so keep most of the budget for the head.
+    tail = MAX_CONTEXT_TOKENS // 4
+    head = MAX_CONTEXT_TOKENS - tail
+    return f"{enc.decode(ids[:head])}\n\n[...]\n\n{enc.decode(ids[-tail:])}"
 
 
-def answer_question(retriever, question: str, model: str, temperature: float, api_key: str) -> QAResult:
-    llm = ChatOpenAI(model=model, temperature=temperature, api_key=api_key)
+def answer_question(
+    retriever, question: str, model: str, temperature: float, api_key: str, cache: Optional[SemanticCache] = None
+) -> QAResult:
+    llm = get_chat_model(model, 0 if cache else temperature, api_key)
 
     docs = retriever.get_relevant_documents(question)
-    context = "\n\n".join([d.page_content for d in docs])
-    system = (
-        "You are a helpful assistant that answers strictly based on the provided context. "
-        "If the answer is not contained in the context, say you don't know. Provide concise answers."
-    )
+    context = _build_context(docs)
     messages = [
-        {"role": "system", "content": system},
-        {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"},
+        {"role": "system", "content": STATIC_SYSTEM},
+        {"role": "user", "content": USER_TEMPLATE.format(context=context, question=question)},
     ]
-    response = llm.invoke(messages)
-    answer_text = response.content if hasattr(response, "content") else str(response)
-    return QAResult(answer=answer_text, sources=docs)
+    return QAResult(answer=cached_stream(llm, messages, cache, query=question, context=context), sources=docs)
 
 